@@ -1,16 +1,91 @@
 import json
 import sys
 import os
+import signal
+import re
+import time
+import hashlib
+import tempfile
+import zlib
 from datetime import datetime
-from google.oauth2.service_account import Credentials
-from googleapiclient.discovery import build
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-# Map ccxt module
-import bingx.ccxt as ccxt_module
-sys.modules['ccxt'] = ccxt_module
+GOOGLE_SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
 
-from bingx.ccxt import bingx as BingxSync
+# All Positions layout: (header, column number format or None)
+POSITION_COLUMNS = (
+    ("Timestamp", None),
+    ("Symbol", None),
+    ("Side", None),
+    ("Status", None),
+    ("Entry Price", '0.00'),
+    ("Mark Price", '0.00'),
+    ("Contracts", '0.0000'),
+    ("Collateral", '0.00'),
+    ("Unrealized P&L", '0.0000'),
+    ("Realized P&L", '0.0000'),
+    ("Leverage", None),
+    ("Liquidation Price", '0.00'),
+    ("Margin Ratio", '0.0000'),
+)
+
+# Numeric ccxt position fields converted once per row for All Positions
+POSITION_FLOAT_FIELDS = (
+    'contracts', 'unrealizedPnl', 'entryPrice', 'markPrice',
+    'liquidationPrice', 'collateral', 'marginRatio'
+)
+
+# Seconds the BingX market list may be reused between runs (0 disables)
+MARKETS_CACHE_TTL = int(os.getenv('BINGX_MARKETS_TTL', '3600'))
+
+# Seconds a fetched positions list may be reused by the next run (0 disables)
+POSITIONS_CACHE_TTL = int(os.getenv('BINGX_POSITIONS_TTL', '0'))
+
+# Markdown table separator row, including alignment colons
+TABLE_SEPARATOR_RE = re.compile(r'^\|[\s:|-]*-[\s:|-]*$')
+
+# Seconds between update cycles when running as a long-lived process (0 runs once)
+TRACKER_INTERVAL = int(os.getenv('TRACKER_INTERVAL', '0'))
+
+# Seconds a Perplexity market research answer may be reused by the next run (0 disables)
+RESEARCH_CACHE_TTL = int(os.getenv('PERPLEXITY_CACHE_TTL', '0'))
+
+# (connect, read) timeouts for Perplexity: fail fast on a dead connection,
+# but leave room for a long generation
+PERPLEXITY_TIMEOUT = (10, 180)
+
+# Sheets calls retry 429/5xx responses with exponential backoff this many times
+SHEETS_NUM_RETRIES = 5
+
+# {spreadsheet id: {tab title: sheetId}} listed once per tracker cycle
+_sheet_tab_ids = {}
+
+# {spreadsheet id: {sheetId: (rowCount, columnCount)}} from the same listing
+_sheet_grid_sizes = {}
+
+# (rows, columns) cleared before each write, matching the old A1:Z500,
+# A1:M2000 and A1:Z5000 ranges; cells beyond them belong to the user
+PORTFOLIO_CLEAR_SIZE = (500, 26)
+POSITIONS_CLEAR_SIZE = (2000, len(POSITION_COLUMNS))
+ANALYSIS_CLEAR_SIZE = (5000, 26)
+
+# Grid size of tabs created by the tracker
+NEW_TAB_SIZE = (2000, 20)
+
+# Per-user directory for state and caches kept between runs (they can hold account data)
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache')
+
+# Remembers what was last written to each tab between runs
+TRACKER_STATE_FILE = os.getenv(
+    'BINGX_TRACKER_STATE',
+    os.path.join(CACHE_DIR, 'bingx_tracker_state.json')
+)
 
 
 def load_api_keys():
@@ -63,34 +138,118 @@ def safe_float(value, default=0.0):
     """Safely convert value to float with default fallback"""
     if value is None:
         return default
+    # ccxt already parses most numeric fields to float
+    if type(value) is float:
+        return value
     try:
         return float(value)
     except (TypeError, ValueError):
         return default
 
 
-def safe_round(value, decimals=2, default=0.0):
-    """Safely round a value"""
-    num = safe_float(value, default)
-    return round(num, decimals)
+def load_json_cache(name, ttl):
+    """Return the JSON cached in CACHE_DIR under name if younger than ttl seconds, else None"""
+    if ttl <= 0:
+        return None
+    
+    path = os.path.join(CACHE_DIR, name)
+    try:
+        if time.time() - os.path.getmtime(path) >= ttl:
+            return None
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_json_cache(name, ttl, data):
+    """Save data to CACHE_DIR under name for later runs (no-op when ttl is disabled)"""
+    if ttl <= 0:
+        return
+    
+    try:
+        os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+        # Owner-only: the positions cache holds account data
+        fd = os.open(os.path.join(CACHE_DIR, name), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+    except (OSError, TypeError, ValueError) as e:
+        print(f"⚠️  Could not write cache {name}: {e}")
+
+
+def create_retrying_session(allowed_methods, backoff_factor=0.3,
+                            status_forcelist=(429, 500, 502, 503, 504), retry_reads=True):
+    """Create a keep-alive requests.Session that backs off and retries status_forcelist responses
+    
+    retry_reads=False stops a request that was sent but timed out or broke
+    while reading the response from being sent again.
+    """
+    retry = Retry(
+        total=3,
+        read=None if retry_reads else 0,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_forcelist,
+        allowed_methods=allowed_methods
+    )
+    
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=4,
+        max_retries=retry,
+        pool_block=False
+    ))
+    return session
+
+
+def create_bingx_client(api_key, api_secret):
+    """Create the BingX swap client shared by all exchange calls"""
+    # ccxt is imported here so runs that stop at key validation never load it.
+    # Map ccxt module (keep an already-registered ccxt so module identity stays stable)
+    import bingx.ccxt as ccxt_module
+    sys.modules.setdefault('ccxt', ccxt_module)
+    
+    from bingx.ccxt import bingx as BingxSync
+    
+    client = BingxSync({
+        'apiKey': api_key,
+        'secret': api_secret,
+        'enableRateLimit': True,
+        'options': {
+            'defaultType': 'swap'
+        }
+    })
+    
+    # Balance and positions are signed GETs, safe to retry on 429/5xx
+    client.session = create_retrying_session(frozenset({"GET"}))
+    
+    return client
+
+
+def load_markets_cached(client):
+    """Load BingX markets, reusing a copy saved within MARKETS_CACHE_TTL seconds"""
+    markets = load_json_cache('bingx_markets.json', MARKETS_CACHE_TTL)
+    if markets is not None:
+        client.set_markets(markets)
+        print("✓ BingX markets loaded from cache")
+        return
+    
+    markets = client.load_markets()
+    save_json_cache('bingx_markets.json', MARKETS_CACHE_TTL, markets)
 
 
-def get_account_balance(api_key, api_secret):
-    """Get account balance and calculate P&L - FIXED FOR BINGX"""
+def get_account_balance(client, positions, pending_balance=None):
+    """Get account balance and calculate P&L - FIXED FOR BINGX
+    
+    pending_balance is an optional future for a fetch_balance() call
+    already running in the background. positions is None when
+    get_positions failed, which is reported as an error status.
+    """
     try:
         print("Fetching account balance...")
         
-        client = BingxSync({
-            'apiKey': api_key,
-            'secret': api_secret,
-            'enableRateLimit': True,
-            'options': {
-                'defaultType': 'swap'
-            }
-        })
-        
         # Get balance - BingX returns a dict with currency keys
-        balance = client.fetch_balance()
+        balance = pending_balance.result() if pending_balance else client.fetch_balance()
         
         # Extract USDT balance (main trading currency)
         usdt_balance = balance.get('USDT', {})
@@ -98,17 +257,22 @@ def get_account_balance(api_key, api_secret):
         free_balance = safe_float(usdt_balance.get('free', 0))
         used_balance = safe_float(usdt_balance.get('used', 0))
         
-        print(f"✓ Balance fetched:")
-        print(f"  Total USDT: ${total_balance:.2f}")
-        print(f"  Free USDT: ${free_balance:.2f}")
-        print(f"  Used USDT: ${used_balance:.2f}")
+        # One write per block keeps output from the background threads from interleaving
+        print("\n".join([
+            "✓ Balance fetched:",
+            f"  Total USDT: ${total_balance:.2f}",
+            f"  Free USDT: ${free_balance:.2f}",
+            f"  Used USDT: ${used_balance:.2f}"
+        ]))
         
-        # Get positions for P&L calculation
-        positions = client.fetch_positions()
+        # P&L comes from the positions already fetched by get_positions
+        if positions is None:
+            raise Exception("positions could not be fetched, P&L unavailable")
         
         total_unrealized_pnl = 0
         total_realized_pnl = 0
         active_positions = 0
+        position_lines = []
         
         for pos in positions:
             contracts = safe_float(pos.get('contracts', 0))
@@ -129,17 +293,22 @@ def get_account_balance(api_key, api_secret):
             
             if contracts > 0:
                 active_positions += 1
-                print(f"  Position: {pos.get('symbol')} - Unrealized: ${unrealized:.4f}, Realized: ${realized:.4f}")
+                position_lines.append(f"  Position: {pos.get('symbol')} - Unrealized: ${unrealized:.4f}, Realized: ${realized:.4f}")
+        
+        if position_lines:
+            print("\n".join(position_lines))
         
         total_pnl = total_unrealized_pnl + total_realized_pnl
         pnl_percentage = (total_pnl / total_balance * 100) if total_balance > 0 else 0
         
-        print(f"✓ P&L calculated:")
-        print(f"  Unrealized: ${total_unrealized_pnl:.4f}")
-        print(f"  Realized: ${total_realized_pnl:.4f}")
-        print(f"  Total P&L: ${total_pnl:.4f}")
-        print(f"  P&L %: {pnl_percentage:.2f}%")
-        print(f"  Active Positions: {active_positions}")
+        print("\n".join([
+            "✓ P&L calculated:",
+            f"  Unrealized: ${total_unrealized_pnl:.4f}",
+            f"  Realized: ${total_realized_pnl:.4f}",
+            f"  Total P&L: ${total_pnl:.4f}",
+            f"  P&L %: {pnl_percentage:.2f}%",
+            f"  Active Positions: {active_positions}"
+        ]))
         
         return {
             'total': total_balance,
@@ -170,196 +339,357 @@ def get_account_balance(api_key, api_secret):
         }
 
 
-def get_positions(api_key, api_secret):
-    """Get all trading positions"""
+def positions_cache_name(api_key):
+    """Cache file name for an API key's positions"""
+    key_hash = hashlib.sha1(api_key.encode('utf-8')).hexdigest()[:8]
+    return f"bingx_positions_{key_hash}.json"
+
+
+def get_positions(client):
+    """Get all trading positions, or None if they could not be fetched"""
     try:
         print("Fetching positions...")
         
-        client = BingxSync({
-            'apiKey': api_key,
-            'secret': api_secret,
-            'enableRateLimit': True,
-            'options': {
-                'defaultType': 'swap'
-            }
-        })
+        cache_name = positions_cache_name(client.apiKey)
+        positions = load_json_cache(cache_name, POSITIONS_CACHE_TTL)
+        if positions is not None:
+            print(f"✓ Using positions cached within the last {POSITIONS_CACHE_TTL}s")
+        else:
+            positions = client.fetch_positions()
+            save_json_cache(cache_name, POSITIONS_CACHE_TTL, positions)
         
-        positions = client.fetch_positions()
-        active = [p for p in positions if safe_float(p.get('contracts', 0)) > 0]
-        print(f"✓ Found {len(positions)} total position(s), {len(active)} active")
+        active_count = sum(1 for p in positions if safe_float(p.get('contracts', 0)) > 0)
+        print(f"✓ Found {len(positions)} total position(s), {active_count} active")
         
         return positions
     except Exception as e:
         print(f"❌ Error fetching positions: {e}")
-        return []
+        return None
 
 
 def load_google_credentials():
-    """Load Google credentials from environment or file"""
+    """Load Google service account credentials from environment or file"""
+    from google.oauth2.service_account import Credentials
+    
     creds_json = os.getenv('GOOGLE_CREDENTIALS')
     
     if creds_json:
-        with open("google_credentials.json", "w") as f:
-            f.write(creds_json)
+        try:
+            info = json.loads(creds_json)
+        except ValueError as e:
+            raise Exception(f"GOOGLE_CREDENTIALS is not valid JSON: {e}")
+        
+        # Build credentials in memory - the secret never touches disk
+        creds = Credentials.from_service_account_info(info, scopes=GOOGLE_SCOPES)
         print("✓ Google credentials loaded from environment")
-        return
+        return creds
     
     if not os.path.exists("google_credentials.json"):
         raise Exception("Google credentials not found in environment or file")
     
+    creds = Credentials.from_service_account_file('google_credentials.json', scopes=GOOGLE_SCOPES)
     print("✓ Google credentials loaded from file")
+    return creds
 
 
-def ensure_sheet_exists(service, sheet_id, sheet_name):
-    """Ensure sheet exists"""
-    try:
-        props = service.spreadsheets().get(spreadsheetId=sheet_id).execute()
-        
-        for sheet in props.get('sheets', []):
-            if sheet['properties']['title'] == sheet_name:
-                return True
-        
-        service.spreadsheets().batchUpdate(
+def build_sheets_service(creds):
+    """Build the Sheets client from the bundled discovery document over one pooled connection"""
+    # Imported here so the googleapiclient import runs on the background
+    # thread alongside the BingX calls
+    from googleapiclient.discovery import build
+    from google_auth_httplib2 import AuthorizedHttp
+    import httplib2
+    
+    # Static discovery skips the discovery-document fetch; one AuthorizedHttp
+    # keeps the TLS connection alive across every Sheets call in this run
+    http = AuthorizedHttp(creds, http=httplib2.Http(timeout=30))
+    return build('sheets', 'v4', http=http, static_discovery=True, cache_discovery=False)
+
+
+def find_sheet_tab_id(service, sheet_id, sheet_name):
+    """Return the numeric sheetId of a tab, or None if it does not exist"""
+    # Tabs are listed once per tracker cycle; tabs added here are recorded locally
+    if sheet_id not in _sheet_tab_ids:
+        props = service.spreadsheets().get(
             spreadsheetId=sheet_id,
-            body={'requests': [{
-                'addSheet': {
-                    'properties': {
-                        'title': sheet_name,
-                        'gridProperties': {'rowCount': 2000, 'columnCount': 20}
-                    }
-                }
-            }]}
-        ).execute()
-        
-        return True
-    except Exception as e:
-        raise
+            fields='sheets.properties(sheetId,title,gridProperties(rowCount,columnCount))'
+        ).execute(num_retries=SHEETS_NUM_RETRIES)
+        
+        sheets = [sheet['properties'] for sheet in props.get('sheets', [])]
+        _sheet_tab_ids[sheet_id] = {p['title']: p['sheetId'] for p in sheets}
+        _sheet_grid_sizes[sheet_id] = {
+            p['sheetId']: (
+                p.get('gridProperties', {}).get('rowCount', 0),
+                p.get('gridProperties', {}).get('columnCount', 0)
+            )
+            for p in sheets
+        }
+    
+    return _sheet_tab_ids[sheet_id].get(sheet_name)
+
+
+def add_sheet_request(sheet_name, tab_id=None):
+    """Build an addSheet request, optionally with a caller-chosen sheetId"""
+    properties = {
+        'title': sheet_name,
+        'gridProperties': {'rowCount': NEW_TAB_SIZE[0], 'columnCount': NEW_TAB_SIZE[1]}
+    }
+    if tab_id is not None:
+        properties['sheetId'] = tab_id
+    
+    return {'addSheet': {'properties': properties}}
+
+
+def new_tab_id(sheet_name, taken_ids):
+    """Pick a sheetId for a new tab from its title, skipping ids already in use"""
+    # A renamed tab keeps its id, so the title's hash may already be taken
+    tab_id = zlib.crc32(sheet_name.encode('utf-8')) & 0x7FFFFFFF
+    while tab_id in taken_ids:
+        tab_id = (tab_id + 1) & 0x7FFFFFFF
+    return tab_id
+
 
+def to_cell_data(value):
+    """Convert a Python value to Sheets CellData (same semantics as RAW input)"""
+    if value is None or value == '':
+        # Empty CellData keeps the column position without sending a value
+        return {}
+    if isinstance(value, bool):
+        return {'userEnteredValue': {'boolValue': value}}
+    if isinstance(value, (int, float)):
+        return {'userEnteredValue': {'numberValue': value}}
+    return {'userEnteredValue': {'stringValue': str(value)}}
 
-def write_portfolio_summary_to_sheet(service, sheet_id, balance_info, timestamp):
-    """Write portfolio summary to Google Sheets"""
+
+def load_tracker_state(sheet_id):
+    """Return the state a previous run saved for this spreadsheet"""
     try:
-        sheet_name = "📈 Portfolio"
-        ensure_sheet_exists(service, sheet_id, sheet_name)
-        
-        # Format portfolio data
-        rows = [
-            ["📈 Portfolio Summary"],
-            ["", ""],
-            ["Updated", timestamp],
-            ["", ""],
-            ["Balance:", f"${safe_round(balance_info['total'], 2):.2f}"],
-            ["Free Balance:", f"${safe_round(balance_info['free'], 2):.2f}"],
-            ["Used Balance:", f"${safe_round(balance_info['used'], 2):.2f}"],
-            ["", ""],
-            ["P&L (Total):", f"${safe_round(balance_info['total_pnl'], 4):.4f}"],
-            ["P&L %:", f"{safe_round(balance_info['pnl_percentage'], 2):.2f}%"],
-            ["", ""],
-            ["Unrealized P&L:", f"${safe_round(balance_info['unrealized_pnl'], 4):.4f}"],
-            ["Realized P&L:", f"${safe_round(balance_info['realized_pnl'], 4):.4f}"],
-            ["", ""],
-            ["Active Positions:", balance_info['active_positions']],
-            ["", ""],
-            ["Status", "PROFIT ✓" if balance_info['pnl_percentage'] >= 0 else "LOSS ✗"]
-        ]
+        with open(TRACKER_STATE_FILE, "r") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    
+    if state.get('spreadsheet') != sheet_id:
+        return {}
+    return state
+
+
+def save_tracker_state(sheet_id, state):
+    """Save state for the next run"""
+    state['spreadsheet'] = sheet_id
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(TRACKER_STATE_FILE)), exist_ok=True)
+        with open(TRACKER_STATE_FILE, "w") as f:
+            json.dump(state, f)
+    except OSError as e:
+        print(f"⚠️  Could not save tracker state: {e}")
+
+
+def content_hash(content):
+    """Short digest identifying a piece of sheet content"""
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+def content_unchanged(service, sheet_id, sheet_name, content):
+    """True if the tab currently titled sheet_name was last written with exactly this content"""
+    tab_id = find_sheet_tab_id(service, sheet_id, sheet_name)
+    saved = load_tracker_state(sheet_id).get('content_hashes', {}).get(sheet_name)
+    # The tab id must match too: a renamed or recreated tab is rewritten
+    return tab_id is not None and saved == [tab_id, content_hash(content)]
+
+
+def save_content_hash(service, sheet_id, sheet_name, content):
+    """Remember what was written to a tab so an identical rewrite can be skipped"""
+    tab_id = find_sheet_tab_id(service, sheet_id, sheet_name)
+    state = load_tracker_state(sheet_id)
+    state.setdefault('content_hashes', {})[sheet_name] = [tab_id, content_hash(content)]
+    save_tracker_state(sheet_id, state)
+
+
+def clear_cells_request(tab_id, row_count, column_count):
+    """Build an updateCells request that clears values in the top-left row_count x column_count block"""
+    return {
+        'updateCells': {
+            'range': {
+                'sheetId': tab_id,
+                'startRowIndex': 0,
+                'endRowIndex': row_count,
+                'startColumnIndex': 0,
+                'endColumnIndex': column_count
+            },
+            'fields': 'userEnteredValue'
+        }
+    }
+
+
+def write_cells_request(tab_id, rows):
+    """Build an updateCells request that writes rows starting at A1"""
+    return {
+        'updateCells': {
+            'start': {'sheetId': tab_id, 'rowIndex': 0, 'columnIndex': 0},
+            'rows': [{'values': [to_cell_data(v) for v in row]} for row in rows],
+            'fields': 'userEnteredValue'
+        }
+    }
+
+
+def number_format_requests(tab_id, number_formats):
+    """Build repeatCell requests applying (column_index, pattern) number formats below the header"""
+    return [
+        {
+            'repeatCell': {
+                'range': {
+                    'sheetId': tab_id,
+                    'startRowIndex': 1,
+                    'startColumnIndex': column,
+                    'endColumnIndex': column + 1
+                },
+                'cell': {'userEnteredFormat': {'numberFormat': {'type': 'NUMBER', 'pattern': pattern}}},
+                'fields': 'userEnteredFormat.numberFormat'
+            }
+        }
+        for column, pattern in number_formats
+    ]
+
+
+def replace_sheet_values(service, sheet_id, tabs):
+    """Create or clear each tab and write its rows in a single spreadsheets.batchUpdate round-trip
+    
+    tabs is a list of (sheet_name, rows, number_formats, clear_size) tuples;
+    clear_size is the (rows, columns) block cleared before writing.
+    """
+    batch = []
+    tab_ids = {}
+    for sheet_name, rows, number_formats, clear_size in tabs:
+        tab_id = find_sheet_tab_id(service, sheet_id, sheet_name)
         
-        # Clear and update sheet
-        service.spreadsheets().values().clear(
-            spreadsheetId=sheet_id,
-            range=f'{sheet_name}!A1:Z500'
-        ).execute()
+        if tab_id is None:
+            # New tab: pick the sheetId ourselves so the write can go in the same batch
+            taken_ids = set(_sheet_tab_ids[sheet_id].values()) | set(tab_ids.values())
+            tab_id = new_tab_id(sheet_name, taken_ids)
+            batch.append(add_sheet_request(sheet_name, tab_id))
+        else:
+            # Ranges past the grid are rejected, so stay within the tab
+            grid_rows, grid_columns = _sheet_grid_sizes[sheet_id][tab_id]
+            batch.append(clear_cells_request(
+                tab_id,
+                min(clear_size[0], grid_rows),
+                min(clear_size[1], grid_columns)
+            ))
         
-        service.spreadsheets().values().update(
-            spreadsheetId=sheet_id,
-            range=f'{sheet_name}!A1',
-            valueInputOption='RAW',
-            body={'values': rows}
-        ).execute()
+        batch.append(write_cells_request(tab_id, rows))
+        batch.extend(number_format_requests(tab_id, number_formats))
+        tab_ids[sheet_name] = tab_id
+    
+    service.spreadsheets().batchUpdate(
+        spreadsheetId=sheet_id,
+        body={'requests': batch}
+    ).execute(num_retries=SHEETS_NUM_RETRIES)
+    
+    _sheet_tab_ids[sheet_id].update(tab_ids)
+    for tab_id in tab_ids.values():
+        _sheet_grid_sizes[sheet_id].setdefault(tab_id, NEW_TAB_SIZE)
+
+
+def build_portfolio_summary_rows(balance_info, timestamp):
+    """Build the '📈 Portfolio' sheet rows"""
+    return [
+        ["📈 Portfolio Summary"],
+        ["", ""],
+        ["Updated", timestamp],
+        ["", ""],
+        ["Balance:", f"${balance_info['total']:.2f}"],
+        ["Free Balance:", f"${balance_info['free']:.2f}"],
+        ["Used Balance:", f"${balance_info['used']:.2f}"],
+        ["", ""],
+        ["P&L (Total):", f"${balance_info['total_pnl']:.4f}"],
+        ["P&L %:", f"{balance_info['pnl_percentage']:.2f}%"],
+        ["", ""],
+        ["Unrealized P&L:", f"${balance_info['unrealized_pnl']:.4f}"],
+        ["Realized P&L:", f"${balance_info['realized_pnl']:.4f}"],
+        ["", ""],
+        ["Active Positions:", balance_info['active_positions']],
+        ["", ""],
+        ["Status", (
+            balance_info['status'] if balance_info['status'] != 'OK'
+            else "PROFIT ✓" if balance_info['pnl_percentage'] >= 0 else "LOSS ✗"
+        )]
+    ]
+
+
+def build_all_positions_rows(positions, timestamp):
+    """Build the 'All Positions' sheet rows"""
+    rows = [[header for header, _ in POSITION_COLUMNS]]
+    
+    if not positions:
+        rows.append([timestamp, "NO POSITIONS"] + ["N/A"] * (len(POSITION_COLUMNS) - 2))
+        return rows
+    
+    for pos in positions:
+        values = dict(zip(POSITION_FLOAT_FIELDS, map(safe_float, map(pos.get, POSITION_FLOAT_FIELDS))))
+        status = "ACTIVE" if values['contracts'] > 0 else "CLOSED"
         
-        print(f"✅ Updated '📈 Portfolio' sheet")
+        # Get realized P&L from info
+        info = pos.get('info', {})
+        realized = 0.0
+        if 'realisedProfit' in info:
+            realized = safe_float(info['realisedProfit'], 0)
         
-    except Exception as e:
-        print(f"❌ Error writing portfolio summary: {e}")
+        rows.append([
+            timestamp,
+            pos.get('symbol', ''),
+            pos.get('side', ''),
+            status,
+            values['entryPrice'],
+            values['markPrice'],
+            values['contracts'],
+            values['collateral'],
+            values['unrealizedPnl'],
+            realized,
+            pos.get('leverage', ''),
+            values['liquidationPrice'],
+            values['marginRatio']
+        ])
+    
+    return rows
 
 
-def write_all_positions_to_sheet(service, sheet_id, positions, timestamp):
-    """Write ALL positions to Google Sheets"""
+def write_portfolio_and_positions_to_sheets(service, sheet_id, balance_info, positions, timestamp):
+    """Write the Portfolio summary and All Positions sheets in one Sheets round-trip"""
     try:
-        sheet_name = "All Positions"
-        ensure_sheet_exists(service, sheet_id, sheet_name)
+        # Display precision comes from column formats; cells keep full precision
+        position_formats = [(i, fmt) for i, (_, fmt) in enumerate(POSITION_COLUMNS) if fmt]
         
-        headers = [
-            "Timestamp", "Symbol", "Side", "Status", "Entry Price", "Mark Price", 
-            "Contracts", "Collateral", "Unrealized P&L", "Realized P&L", 
-            "Leverage", "Liquidation Price", "Margin Ratio"
-        ]
+        tabs = [("📈 Portfolio", build_portfolio_summary_rows(balance_info, timestamp), (), PORTFOLIO_CLEAR_SIZE)]
+        # A failed fetch keeps the last good positions instead of recording none
+        if positions is not None:
+            tabs.append((
+                "All Positions",
+                build_all_positions_rows(positions, timestamp),
+                position_formats,
+                POSITIONS_CLEAR_SIZE
+            ))
         
-        rows = [headers]
+        replace_sheet_values(service, sheet_id, tabs)
         
-        if not positions:
-            rows.append([timestamp, "NO POSITIONS", "N/A", "N/A", "N/A", "N/A", "N/A", "N/A", "N/A", "N/A", "N/A", "N/A", "N/A"])
-            print(f"✅ No positions - recorded in sheet")
+        print(f"✅ Updated '📈 Portfolio' sheet")
+        if positions is None:
+            print(f"⚠️  Positions unavailable - 'All Positions' sheet left unchanged")
+        elif positions:
+            print(f"✅ Updated 'All Positions' sheet with {len(positions)} positions")
         else:
-            for pos in positions:
-                contracts = safe_float(pos.get('contracts', 0))
-                status = "ACTIVE" if contracts > 0 else "CLOSED"
-                
-                unrealized = safe_float(pos.get('unrealizedPnl', 0))
-                entry_price = safe_float(pos.get('entryPrice', 0))
-                mark_price = safe_float(pos.get('markPrice', 0))
-                liquidation_price = safe_float(pos.get('liquidationPrice', 0))
-                collateral = safe_float(pos.get('collateral', 0))
-                margin_ratio = safe_float(pos.get('marginRatio', 0))
-                
-                # Get realized P&L from info
-                info = pos.get('info', {})
-                realized = 0
-                if 'realisedProfit' in info:
-                    realized = safe_float(info['realisedProfit'], 0)
-                
-                rows.append([
-                    timestamp,
-                    pos.get('symbol', ''),
-                    pos.get('side', ''),
-                    status,
-                    safe_round(entry_price, 2),
-                    safe_round(mark_price, 2),
-                    safe_round(contracts, 4),
-                    safe_round(collateral, 2),
-                    safe_round(unrealized, 4),
-                    safe_round(realized, 4),
-                    pos.get('leverage', ''),
-                    safe_round(liquidation_price, 2),
-                    safe_round(margin_ratio, 4)
-                ])
-        
-        service.spreadsheets().values().clear(
-            spreadsheetId=sheet_id,
-            range=f'{sheet_name}!A1:M2000'
-        ).execute()
-        
-        service.spreadsheets().values().update(
-            spreadsheetId=sheet_id,
-            range=f'{sheet_name}!A1',
-            valueInputOption='RAW',
-            body={'values': rows}
-        ).execute()
-        
-        print(f"✅ Updated 'All Positions' sheet with {len(rows)-1} positions")
+            print(f"✅ No positions - recorded in sheet")
         
     except Exception as e:
-        print(f"❌ Error writing positions: {e}")
+        print(f"❌ Error writing portfolio and positions: {e}")
 
 
-def generate_market_research_prompt():
-    """Generate prompt for deep market research on assets with current time"""
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    
-    prompt = f"""MARKET RESEARCH AND TRADING SIGNALS TASK:
+# Market research prompt skeleton, filled with the asset list and request time
+MARKET_RESEARCH_PROMPT = """MARKET RESEARCH AND TRADING SIGNALS TASK:
     Time generated: {current_time}
 
 
-    Analyze the current cryptocurrency and stock markets for Bitcoin (BTC), Ethereum (ETH), Solana (SOL), Amazon (AMZN), Google (GOOGL), and Tesla (TSLA).
+    Analyze the current cryptocurrency and stock markets for {assets}.
     - Use REAL-TIME current prices and data on [https://coinmarketcap.com/]
     1. **CURRENT PRICE & SENTIMENT TABLE:**
     | Asset | Current Price | 24h Change % | Sentiment | Trend | Volume |
@@ -408,21 +738,41 @@ def generate_market_research_prompt():
     - Be specific about timeframes for trades
     - Make it as a text
 - Include confidence levels and risk assessments"""
-    
-    return prompt
 
-def send_to_perplexity_market_research(perplexity_api_key):
+# Assets covered by the market research
+RESEARCH_ASSET_LIST = "Bitcoin (BTC), Ethereum (ETH), Solana (SOL), Amazon (AMZN), Google (GOOGL), and Tesla (TSLA)"
+
+
+def generate_market_research_prompt():
+    """Generate prompt for deep market research on assets with current time"""
+    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return MARKET_RESEARCH_PROMPT.format(current_time=current_time, assets=RESEARCH_ASSET_LIST)
+
+
+def create_perplexity_session(perplexity_api_key):
+    """Create a keep-alive Perplexity session that retries rate-limited (429) requests"""
+    # Every POST that reaches the server is a paid generation: only retry
+    # connection failures and 429s, never read timeouts or 5xx
+    session = create_retrying_session(
+        frozenset({"POST"}),
+        backoff_factor=0.5,
+        status_forcelist=(429,),
+        retry_reads=False
+    )
+    session.headers.update({
+        "Authorization": f"Bearer {perplexity_api_key}",
+        "Content-Type": "application/json"
+    })
+    return session
+
+
+def send_to_perplexity_market_research(session):
     """Send market research request to Perplexity"""
     try:
         print("\n🔍 Sending market research request to Perplexity...")
         
         prompt = generate_market_research_prompt()
         
-        headers = {
-            "Authorization": f"Bearer {perplexity_api_key}",
-            "Content-Type": "application/json"
-        }
-        
         payload = {
             "model": "sonar",
             "messages": [
@@ -436,11 +786,21 @@ def send_to_perplexity_market_research(perplexity_api_key):
             "presence_penalty": 0.0
         }
         
-        response = requests.post(
+        # The prompt only varies by its timestamp, so the template, asset list and
+        # request settings identify an equivalent earlier answer
+        settings = {k: v for k, v in payload.items() if k != "messages"}
+        request_key = json.dumps([MARKET_RESEARCH_PROMPT, RESEARCH_ASSET_LIST, settings], sort_keys=True)
+        cache_name = f"perplexity_research_{hashlib.sha1(request_key.encode('utf-8')).hexdigest()[:12]}.json"
+        
+        research = load_json_cache(cache_name, RESEARCH_CACHE_TTL)
+        if research is not None:
+            print(f"✓ Reusing market research from the last {RESEARCH_CACHE_TTL}s")
+            return research
+        
+        response = session.post(
             "https://api.perplexity.ai/chat/completions",
-            headers=headers,
             json=payload,
-            timeout=180
+            timeout=PERPLEXITY_TIMEOUT
         )
         
         response.raise_for_status()
@@ -448,6 +808,7 @@ def send_to_perplexity_market_research(perplexity_api_key):
         
         research = result['choices'][0]['message']['content']
         print("✓ Received market research from Perplexity")
+        save_json_cache(cache_name, RESEARCH_CACHE_TTL, research)
         
         return research
     except Exception as e:
@@ -467,10 +828,14 @@ def format_analysis_for_csv(analysis_content):
             if not line:
                 continue
             
+            # Skip markdown table separator rows (|---|:---:|)
+            if TABLE_SEPARATOR_RE.match(line):
+                continue
+            
             # Handle table rows (CSV format for Sheets)
             if line.startswith('|'):
                 cells = [cell.strip() for cell in line.split('|')]
-                cells = [cell for cell in cells if cell and cell != '---' and not all(c == '-' for c in cell)]
+                cells = [cell for cell in cells if cell]
                 if cells:
                     rows.append(cells)
             
@@ -507,13 +872,10 @@ def format_analysis_for_csv(analysis_content):
 def write_to_analysis_sheet(service, sheet_id, sheet_name, analysis_content, timestamp):
     """Write analysis to Google Sheets in CSV-compatible format"""
     try:
-        ensure_sheet_exists(service, sheet_id, sheet_name)
-        
-        print(f"🗑️  Clearing '{sheet_name}' sheet...")
-        service.spreadsheets().values().clear(
-            spreadsheetId=sheet_id,
-            range=f'{sheet_name}!A1:Z5000'
-        ).execute()
+        # A reused (cached) answer is already on the sheet
+        if content_unchanged(service, sheet_id, sheet_name, analysis_content):
+            print(f"⏭️  '{sheet_name}' sheet already has this analysis - skipped")
+            return
         
         rows = [
             ["Timestamp", timestamp],
@@ -526,22 +888,109 @@ def write_to_analysis_sheet(service, sheet_id, sheet_name, analysis_content, tim
         analysis_rows = format_analysis_for_csv(analysis_content)
         rows.extend(analysis_rows)
         
-        # Write new data
-        service.spreadsheets().values().update(
-            spreadsheetId=sheet_id,
-            range=f'{sheet_name}!A1',
-            valueInputOption='RAW',
-            body={'values': rows}
-        ).execute()
+        # Replace the previous analysis in one round-trip
+        replace_sheet_values(service, sheet_id, [(sheet_name, rows, (), ANALYSIS_CLEAR_SIZE)])
+        save_content_hash(service, sheet_id, sheet_name, analysis_content)
         
         print(f"✅ Updated '{sheet_name}' sheet with {len(rows)} rows")
         
     except Exception as e:
         print(f"❌ Error writing to {sheet_name}: {e}")
+        
+        # Keep the (paid) analysis so a Sheets failure does not lose it
+        backup_name = f"{sheet_name.lower().replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md"
+        backup_path = os.path.join(tempfile.gettempdir(), backup_name)
+        try:
+            with open(backup_path, "w", encoding="utf-8") as f:
+                f.write(analysis_content)
+            print(f"💾 Saved {sheet_name} to {backup_path}")
+        except OSError as save_error:
+            print(f"⚠️  Could not save {sheet_name} locally: {save_error}")
+
+
+def run_tracker_cycle(client, sheets_future, sheet_id, executor, perplexity_session=None):
+    """Fetch BingX data and update every sheet once, reusing the long-lived clients"""
+    # Tabs may be renamed or deleted between cycles, so list them afresh
+    _sheet_tab_ids.clear()
+    _sheet_grid_sizes.clear()
+    
+    # Market research does not depend on positions, so it runs alongside
+    # the BingX calls and Sheets writes
+    research_future = None
+    if perplexity_session:
+        research_future = executor.submit(send_to_perplexity_market_research, perplexity_session)
+    
+    # Fetch the balance in the background while positions are fetched here
+    balance_future = executor.submit(client.fetch_balance)
+    
+    # Get positions
+    print("\n📊 Step 1: Fetching Positions")
+    print("-" * 100)
+    positions = get_positions(client)
+    
+    # Get account balance (NOW FIXED)
+    print("\n💰 Step 2: Fetching Account Balance")
+    print("-" * 100)
+    balance_info = get_account_balance(client, positions, balance_future)
+    
+    print("\n".join([
+        "\n✓ Final Balance Info:",
+        f"  Total: ${balance_info['total']:.2f}",
+        f"  P&L: ${balance_info['total_pnl']:.4f}",
+        f"  P&L %: {balance_info['pnl_percentage']:.2f}%",
+        f"  Status: {balance_info['status']}"
+    ]))
+    
+    # Setup Google Sheets
+    print("\n📝 Step 3: Writing to Google Sheets")
+    print("-" * 100)
+    service = sheets_future.result()
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    # Write portfolio and positions together
+    write_portfolio_and_positions_to_sheets(service, sheet_id, balance_info, positions, timestamp)
+    
+    # Market Research (Optional - only if API key available)
+    if research_future:
+        print("\n🔍 Step 4: Generating Market Research")
+        print("-" * 100)
+        
+        market_research = research_future.result()
+        
+        if market_research:
+            print("Market research received, formatting for sheets...")
+            write_to_analysis_sheet(service, sheet_id, "Market Research", market_research, timestamp)
+    else:
+        print("\n⏭️  Step 4: Skipping Market Research (API key not available)")
+    
+    summary = [
+        "",
+        "=" * 100,
+        "✅ Portfolio tracker completed successfully!",
+        "=" * 100,
+        "\n📊 Google Sheets updated:",
+        "   - '📈 Portfolio' sheet (Balance, P&L, P&L %)",
+        "   - 'All Positions' sheet (position details)"
+    ]
+    if perplexity_session:
+        summary.append("   - 'Market Research' sheet (trading signals & analysis)")
+    print("\n".join(summary))
+
+
+def handle_sigterm(signum, frame):
+    """Stop the tracker on SIGTERM the same way as Ctrl-C"""
+    # A second SIGTERM terminates right away instead of interrupting the shutdown
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    raise KeyboardInterrupt
 
 
 if __name__ == "__main__":
+    executor = None
+    # True only while waiting between cycles, where stopping loses no work
+    idle = False
     try:
+        signal.signal(signal.SIGTERM, handle_sigterm)
+        
         print("=" * 100)
         print("BingX Portfolio Tracker - Environment Variables Version")
         print(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
@@ -554,71 +1003,45 @@ if __name__ == "__main__":
         # Load API keys from environment
         api_key, api_secret = load_api_keys()
         
-        # Get positions
-        print("\n📊 Step 1: Fetching Positions")
-        print("-" * 100)
-        positions = get_positions(api_key, api_secret)
-        
-        # Get account balance (NOW FIXED)
-        print("\n💰 Step 2: Fetching Account Balance")
-        print("-" * 100)
-        balance_info = get_account_balance(api_key, api_secret)
-        
-        print(f"\n✓ Final Balance Info:")
-        print(f"  Total: ${balance_info['total']:.2f}")
-        print(f"  P&L: ${balance_info['total_pnl']:.4f}")
-        print(f"  P&L %: {balance_info['pnl_percentage']:.2f}%")
-        print(f"  Status: {balance_info['status']}")
-        
-        # Setup Google Sheets
-        print("\n📝 Step 3: Writing to Google Sheets")
-        print("-" * 100)
-        load_google_credentials()
-        
-        creds = Credentials.from_service_account_file(
-            'google_credentials.json',
-            scopes=[
-                'https://www.googleapis.com/auth/spreadsheets',
-                'https://www.googleapis.com/auth/drive'
-            ]
-        )
+        # Build the Sheets client in the background while BingX is queried
+        creds = load_google_credentials()
+        executor = ThreadPoolExecutor(max_workers=3)
+        sheets_future = executor.submit(build_sheets_service, creds)
         
-        service = build('sheets', 'v4', credentials=creds)
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        # Write portfolio
-        write_portfolio_summary_to_sheet(service, SHEET_ID, balance_info, timestamp)
-        
-        # Write positions
-        write_all_positions_to_sheet(service, SHEET_ID, positions, timestamp)
-        
-        # Market Research (Optional - only if API key available)
         perplexity_key = load_perplexity_api_key()
+        perplexity_session = create_perplexity_session(perplexity_key) if perplexity_key else None
         
-        if perplexity_key:
-            print("\n🔍 Step 4: Generating Market Research")
-            print("-" * 100)
+        # One client for every BingX call, so markets load once per process
+        client = create_bingx_client(api_key, api_secret)
+        try:
+            load_markets_cached(client)
+        except Exception as e:
+            # The fetches report their own errors
+            print(f"⚠️  Could not preload BingX markets: {e}")
+        
+        # TRACKER_INTERVAL > 0 keeps the process (and its warm clients) running
+        while True:
+            run_tracker_cycle(client, sheets_future, SHEET_ID, executor, perplexity_session)
             
-            market_research = send_to_perplexity_market_research(perplexity_key)
+            if TRACKER_INTERVAL <= 0:
+                break
             
-            if market_research:
-                print("Market research received, formatting for sheets...")
-                write_to_analysis_sheet(service, SHEET_ID, "Market Research", market_research, timestamp)
-        else:
-            print("\n⏭️  Step 4: Skipping Market Research (API key not available)")
-        
-        print()
-        print("=" * 100)
-        print("✅ Portfolio tracker completed successfully!")
-        print("=" * 100)
-        print("\n📊 Google Sheets updated:")
-        print("   - '📈 Portfolio' sheet (Balance, P&L, P&L %)")
-        print("   - 'All Positions' sheet (position details)")
-        if perplexity_key:
-            print("   - 'Market Research' sheet (trading signals & analysis)")
+            print(f"\n⏳ Next update in {TRACKER_INTERVAL}s ({datetime.now().strftime('%Y-%m-%d %H:%M:%S')})")
+            idle = True
+            time.sleep(TRACKER_INTERVAL)
+            idle = False
         
+    except KeyboardInterrupt:
+        print("\n⏹️  Tracker stopped")
+        if not idle:
+            # A cycle (or setup) was cut short
+            sys.exit(130)
     except Exception as e:
         print(f"❌ Fatal error: {e}")
         import traceback
         traceback.print_exc()
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+    finally:
+        # Don't start queued work after Ctrl-C or a fatal error
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)